@@ -1,9 +1,22 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+from plotly.colors import make_colorscale, sample_colorscale
 import numpy as np
 import openai # Importation de la bibliothèque OpenAI
 import os
+import io
+import functools
+import json
+import hashlib
+from statistics import NormalDist
+from bootstrap import BootstrapEngine
+from ingest import aggregate_chunks, cumulative_incidence, poisson_rate_ci, CLASS_COLUMN, DEFAULT_CHUNKSIZE
+from effect_index import EffectIndex
+from renderer import RendererPool, FORMATS as IMAGE_FORMATS
+from validation import check_dataset
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -67,7 +80,12 @@ st.sidebar.title("⚙️ Paramètres")
 st.sidebar.markdown("---")
 
 # Data preparation
-@st.cache_data
+# cache_resource keeps a single DataFrame per process shared by every session
+# (cache_data would hand each rerun its own deserialized copy). Nothing below
+# mutates it; sessions only take views, and pandas copy-on-write (the default from
+# pandas 3, pinned in requirements.txt) gives any later modification of a view its
+# own copy instead of touching the shared data.
+@st.cache_resource
 def load_data():
     # Données corrigées avec des valeurs cohérentes
     data = {
@@ -133,16 +151,273 @@ def load_data():
                      1.60, 1.53, 1.33, 2.25, 1.59, 1.52, 2.08, 1.19, 1.19, 1.13, 0.40, 0.42,
                      0.87, 0.31, 0.30, 0.52, 0.32, 0.23, 0.57, 0.65, 0.48]
     }
+    # Classe de systèmes d'organes (MedDRA) de chaque effet
+    classes = {
+        'Décès': "Troubles généraux et anomalies au site d'administration",
+        'Infections graves': "Infections et infestations",
+        'Zona (non grave et grave)': "Infections et infestations",
+        'Zona grave': "Infections et infestations",
+        'Infections opportunistes': "Infections et infestations",
+        'Cancers (excluant NMSC)': "Tumeurs bénignes, malignes et non précisées",
+        'NMSC': "Tumeurs bénignes, malignes et non précisées",
+        'MACE': "Affections cardiaques",
+        'Perforations gastro-intestinales': "Affections gastro-intestinales",
+        'Thrombose veineuse profonde': "Affections vasculaires",
+        'Embolie pulmonaire': "Affections respiratoires, thoraciques et médiastinales",
+    }
+    data[CLASS_COLUMN] = [classes[effect] for effect in data['Effet indésirable']]
     
-    df = pd.DataFrame(data)
+    return finalize_dataset(pd.DataFrame(data))
+
+def finalize_dataset(df, version=None, level=0.95):
+    """Add the derived columns and tag the dataset version and confidence level."""
     # Recalculate percentages based on actual data
     df['Pourcentage'] = (df['Nombre de cas'] / df['Total Patients'] * 100).round(2)
     df['Error_Low'] = df['TI'] - df['IC95_min']
     df['Error_High'] = df['IC95_max'] - df['TI']
+    # Content hash identifying this version of the dataset (keys derived caches)
+    df.attrs['version'] = version or hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()).hexdigest()[:12]
+    # Confidence level of the 'IC95_min' / 'IC95_max' columns (they hold the plotted interval)
+    df.attrs['level'] = level
     return df
 
+# Confidence levels offered in the sidebar
+CONFIDENCE_LEVELS = [0.80, 0.90, 0.95, 0.99]
+
+def rescale_interval(ti, low, high, ratio):
+    """Interval bounds with their half-widths around TI multiplied by `ratio`.
+
+    Half-widths are scaled on the log scale; bounds at zero (no case, or a
+    lower bound of 0) fall back to the linear scale. Both are monotone in
+    `ratio`, so intervals at increasing levels are nested.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_low = ti * (low / ti) ** ratio
+        log_high = ti * (high / ti) ** ratio
+    new_low = np.where((low > 0) & (ti > 0), log_low, np.maximum(ti - (ti - low) * ratio, 0))
+    new_high = np.where(ti > 0, log_high, ti + (high - ti) * ratio)
+    return np.minimum(new_low, ti), np.maximum(new_high, ti)
+
+@st.cache_resource
+def at_confidence_level(version, level, _data):
+    """Dataset with every interval recomputed at `level` in one vectorized pass.
+
+    With an exposure column ('Années-patients'), intervals are the Poisson
+    intervals of the counts at `level`, as in ingestion and the animation.
+    Otherwise they are rescaled from the source intervals, so levels stay
+    nested. The source level returns the data unchanged. Memoized per
+    (dataset version, level).
+    """
+    source_level = _data.attrs.get('level', 0.95)
+    if level == source_level:
+        return _data
+    if 'Années-patients' in _data.columns:
+        _, low, high = poisson_rate_ci(_data['Nombre de cas'], _data['Années-patients'], level)
+        method = 'poisson'
+    else:
+        z = NormalDist().inv_cdf
+        ratio = z(1 - (1 - level) / 2) / z(1 - (1 - source_level) / 2)
+        low, high = rescale_interval(_data['TI'].to_numpy(dtype=float), _data['IC95_min'].to_numpy(dtype=float),
+                                     _data['IC95_max'].to_numpy(dtype=float), ratio)
+        method = 'rescaled'
+    # Other columns (drug, class...) are kept; the derived ones are recomputed
+    result = _data.drop(columns=['Pourcentage', 'Error_Low', 'Error_High'], errors='ignore')
+    result['IC95_min'] = low.round(2)
+    result['IC95_max'] = high.round(2)
+    result = finalize_dataset(result, version=f"{version}-ic{round(level * 100)}", level=level)
+    result.attrs['source_level'] = source_level
+    result.attrs['interval_method'] = method
+    return result
+
+def level_pct(data):
+    return f"{data.attrs.get('level', 0.95) * 100:g}"
+
+def interval_labels(data):
+    """Display names of the interval columns at the dataset's confidence level."""
+    pct = level_pct(data)
+    return {'IC95_min': f'IC{pct}_min', 'IC95_max': f'IC{pct}_max'}
+
+def filter_view(data, groups, effects, rank_by=None, top_k=None):
+    """Return the rows matching the selections without copying when possible.
+
+    When every row is selected the shared frame itself is returned; otherwise
+    only the selected rows are gathered, once. `effects=None` keeps every
+    effect. With `rank_by`, only the `top_k` best-ranked selected effects of
+    each group are kept.
+    """
+    mask = data['Groupe'].isin(groups).to_numpy()
+    if effects is not None:
+        mask = mask & data['Effet indésirable'].isin(effects).to_numpy()
+    if rank_by is not None:
+        mask = top_k_mask(ranking_index(data.attrs['version'], data), rank_by, top_k, mask)
+    if mask.all():
+        return data
+    return data[mask]
+
+def group_slices(groups):
+    """Rows grouped by group: codes, groups in order of appearance, row order and slice bounds.
+
+    The rows of the i-th group are order[bounds[i]:bounds[i + 1]], in their original order.
+    """
+    codes, uniques = pd.factorize(groups, sort=False)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(uniques)))))
+    return codes, uniques, order, bounds
+
+# Ranking criteria for the top-K mode (higher key = stronger signal)
+RANKINGS = ["TI le plus élevé", "IC le plus large", "IC entièrement au-dessus de 1"]
+
+@st.cache_resource
+def ranking_index(version, _data):
+    """Rows grouped by 'Groupe' and the sort key of each ranking, built once per dataset version."""
+    _, _, order, bounds = group_slices(_data['Groupe'])
+    ti = _data['TI'].to_numpy()
+    low = _data['IC95_min'].to_numpy()
+    high = _data['IC95_max'].to_numpy()
+    keys = {
+        RANKINGS[0]: ti.astype(float),
+        RANKINGS[1]: (high - low).astype(float),
+        # Only intervals above the TI = 1 reference qualify, ranked by their lower bound
+        RANKINGS[2]: np.where(low > 1, low, -np.inf).astype(float),
+    }
+    return order, bounds, keys
+
+def top_k_mask(index, rank_by, k, selected):
+    """Mask of the k best selected rows per group, using argpartition instead of a full sort."""
+    order, bounds, keys = index
+    key = np.where(selected, keys[rank_by], -np.inf)
+    mask = np.zeros(len(key), dtype=bool)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        rows = order[start:stop]
+        if len(rows) > k:
+            rows = rows[np.argpartition(-key[rows], k - 1)[:k]]
+        mask[rows[np.isfinite(key[rows])]] = True
+    return mask
+
+def session_memory_bytes(view, shared):
+    """Bytes held by `view` that are not shared with the cached dataset."""
+    if view is shared:
+        return 0
+    total = 0
+    for col in view.columns:
+        values = view[col].to_numpy()
+        if col in shared.columns and np.shares_memory(values, shared[col].to_numpy()):
+            continue
+        total += int(view[col].memory_usage(index=False, deep=True))
+    return total
+
+# Patient-level records for bootstrap intervals (optional, paths from the environment)
+PATIENTS_PATH = os.getenv('PATIENTS_PATH')
+EVENTS_PATH = os.getenv('EVENTS_PATH')
+INGEST_CHUNKSIZE = int(os.getenv('INGEST_CHUNKSIZE', DEFAULT_CHUNKSIZE))
+# Event time since treatment start, used by the follow-up animation
+TIME_COLUMN = 'Délai (années)'
+
+def read_table(path):
+    return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+
+def file_version(*paths):
+    """Cheap version tag from file names, sizes and modification times."""
+    stamp = '|'.join(f"{path}:{os.path.getsize(path)}:{os.path.getmtime(path)}" for path in paths)
+    return hashlib.sha1(stamp.encode('utf-8')).hexdigest()[:12]
+
+@st.cache_resource
+def load_ingested_data(patients_path, events_path, version):
+    """Aggregated dataset streamed from the patient-level tables (Poisson CIs)."""
+    aggregated = aggregate_chunks(patients_path, events_path, chunksize=INGEST_CHUNKSIZE)
+    return finalize_dataset(aggregated, version=version)
+
+@st.cache_resource
+def load_patient_data(patients_path, events_path):
+    patients = read_table(patients_path)
+    events = read_table(events_path)
+    version = hashlib.sha1(
+        pd.util.hash_pandas_object(patients, index=False).to_numpy().tobytes()
+        + pd.util.hash_pandas_object(events, index=False).to_numpy().tobytes()
+    ).hexdigest()[:12]
+    return patients, events, version
+
+@st.cache_resource
+def load_cumulative_windows(patients_path, events_path, n_windows, level):
+    """Cumulative rates per follow-up window, built once per (data, windows, level)."""
+    patients, events, _ = load_patient_data(patients_path, events_path)
+    if TIME_COLUMN not in events.columns:
+        return None
+    return cumulative_incidence(patients, events, n_windows, level, TIME_COLUMN)
+
+@st.cache_resource
+def get_bootstrap_engine():
+    return BootstrapEngine(seed=0)
+
+@st.cache_resource
+def get_renderer_pool():
+    """Static-image renderers shared by all sessions (processes start on the first export)."""
+    return RendererPool(size=int(os.getenv('RENDERER_POOL_SIZE', 2)))
+
+@st.cache_resource
+def load_bootstrap_data(patients_path, events_path, n_replicates, level):
+    """Dataset whose TI / IC columns come from the bootstrap engine."""
+    patients, events, version = load_patient_data(patients_path, events_path)
+    result = get_bootstrap_engine().compute(version, patients, events, n_replicates, level)
+    return finalize_dataset(result, version=f"{version}-boot{n_replicates}-ic{round(level * 100)}", level=level)
+
+@st.cache_resource
+def get_effect_index(version, _data):
+    """Prefix / trigram index of the effects by organ class, built once per dataset version."""
+    classes = _data[CLASS_COLUMN] if CLASS_COLUMN in _data.columns else None
+    return EffectIndex(_data['Effet indésirable'], classes)
+
 # Load data
-df = load_data()
+if PATIENTS_PATH and EVENTS_PATH:
+    df = load_ingested_data(PATIENTS_PATH, EVENTS_PATH, file_version(PATIENTS_PATH, EVENTS_PATH))
+else:
+    df = load_data()
+# Effect terms and their classes come from the loaded dataset (bootstrap rows carry no class)
+effect_index = get_effect_index(df.attrs['version'], df)
+
+st.sidebar.subheader("🎲 Intervalles de confiance")
+confidence_level = st.sidebar.select_slider(
+    "Niveau de confiance:",
+    options=CONFIDENCE_LEVELS,
+    value=0.95,
+    format_func=lambda level: f"{level * 100:g}%"
+)
+
+if PATIENTS_PATH and EVENTS_PATH:
+    ci_method = st.sidebar.radio(
+        "Méthode:",
+        options=["Poisson (exposition)", "Bootstrap (données patients)"],
+        index=0
+    )
+    if ci_method.startswith("Bootstrap"):
+        n_replicates = st.sidebar.select_slider("Réplications", options=[200, 500, 1000, 2000, 5000], value=1000)
+        with st.spinner("Calcul des intervalles bootstrap..."):
+            df = load_bootstrap_data(PATIENTS_PATH, EVENTS_PATH, n_replicates, confidence_level)
+
+# Loaded dataset, before intervals are rescaled to the chosen level (checked for consistency)
+source_df = df
+df = at_confidence_level(df.attrs['version'], confidence_level, df)
+if df.attrs.get('interval_method') == 'poisson':
+    st.sidebar.caption(f"IC {level_pct(df)}% recalculés à partir des cas et des années-patients (Poisson, Byar).")
+elif 'source_level' in df.attrs:
+    source_pct = f"{df.attrs['source_level'] * 100:g}"
+    st.sidebar.caption(
+        f"Pas d'exposition dans les données : IC {level_pct(df)}% déduits des IC {source_pct}%, demi-largeurs "
+        f"(échelle log) multipliées par z({level_pct(df)}%) / z({source_pct}%), intervalles emboîtés d'un niveau à l'autre."
+    )
+
+# Default view settings (also used to prebuild the first-paint snapshot)
+DEFAULT_HEIGHT = 900
+DEFAULT_WIDTH = 1300
+DEFAULT_THEME = "Classique"
+TABLE_COLUMNS = ['Effet indésirable', 'Groupe', 'Nombre de cas', 'Total Patients', 'Pourcentage', 'TI', 'IC95_min', 'IC95_max']
+PAGE_SIZES = [25, 50, 100, 250]
+DEFAULT_PAGE_SIZE = 25
+EXPORT_CHUNK_ROWS = 50_000
+# Effect picker: options listed per search, effects selected on first load
+MAX_EFFECT_OPTIONS = 200
+DEFAULT_EFFECT_LIMIT = 20
+ALL_CLASSES = "Toutes les classes"
 
 # Sidebar filters
 st.sidebar.subheader("📊 Filtres")
@@ -156,167 +431,229 @@ selected_groups = st.sidebar.multiselect(
     help="Choisissez les groupes de dosage à afficher"
 )
 
-# Effect selection
-effects_available = df['Effet indésirable'].unique()
+# Effect selection: organ class, then terms found through the index (never the full list)
+effects_available = effect_index.terms
+effect_class = st.sidebar.selectbox(
+    "Classe de systèmes d'organes:",
+    options=[ALL_CLASSES] + list(effect_index.classes),
+    format_func=lambda name: f"{name} ({len(effect_index) if name == ALL_CLASSES else effect_index.class_sizes[effect_index.classes.get_loc(name)]})"
+)
+effect_query = st.sidebar.text_input(
+    "Rechercher un effet:",
+    value="",
+    help="Début d'un mot ou fragment du terme (accents ignorés)"
+)
+matches = effect_index.search(effect_query, None if effect_class == ALL_CLASSES else effect_class, MAX_EFFECT_OPTIONS)
+# Bounded default selection, shared by new sessions and the prebuilt snapshot
+default_effects = effect_index.search(limit=DEFAULT_EFFECT_LIMIT)
+st.session_state.setdefault('effect_picker', default_effects)
+
+def add_matches(terms):
+    st.session_state['effect_picker'] = list(dict.fromkeys(st.session_state['effect_picker'] + terms))
+
 selected_effects = st.sidebar.multiselect(
     "Sélectionner les effets indésirables:",
-    options=effects_available,
-    default=effects_available,
-    help="Choisissez les effets indésirables à afficher"
+    # Current selection first, then the matches of the search
+    options=list(dict.fromkeys(st.session_state['effect_picker'] + matches)),
+    key='effect_picker',
+    help=f"Au plus {MAX_EFFECT_OPTIONS} résultats par recherche ; la sélection est conservée entre les recherches"
+)
+st.sidebar.button(
+    f"➕ Ajouter les {len(matches)} résultats",
+    on_click=add_matches,
+    args=(matches,),
+    disabled=not matches
+)
+
+# Top-K ranking mode
+ranking_mode = st.sidebar.selectbox(
+    "Classement des signaux:",
+    options=["Aucun"] + RANKINGS,
+    index=0,
+    help="N'afficher que les K effets les mieux classés de chaque groupe, parmi tous les effets de la classe choisie"
 )
+if ranking_mode != "Aucun":
+    top_k = st.sidebar.number_input("K (effets par groupe)", min_value=1, max_value=max(1, len(effects_available)), value=min(5, len(effects_available)), step=1)
+    rank_by = ranking_mode
+    # Candidates: the whole organ class (or index), not only the hand-picked effects
+    if effect_class == ALL_CLASSES:
+        ranked_effects = None
+        st.sidebar.caption(f"Classement parmi les {len(effect_index)} effets")
+    else:
+        ranked_effects = effect_index.terms[effect_index.class_of(effect_class)]
+        st.sidebar.caption(f"Classement parmi les {len(ranked_effects)} effets de la classe « {effect_class} »")
+else:
+    top_k = None
+    rank_by = None
 
 # Plot dimensions
 st.sidebar.subheader("📐 Dimensions du graphique")
-plot_height = st.sidebar.slider("Hauteur", min_value=600, max_value=1200, value=900, step=50)
-plot_width = st.sidebar.slider("Largeur", min_value=800, max_value=1500, value=1300, step=50)
+plot_height = st.sidebar.slider("Hauteur", min_value=600, max_value=1200, value=DEFAULT_HEIGHT, step=50)
+plot_width = st.sidebar.slider("Largeur", min_value=800, max_value=1500, value=DEFAULT_WIDTH, step=50)
 
 # Color theme selection
 st.sidebar.subheader("🎨 Thème de couleurs")
 color_theme = st.sidebar.selectbox(
     "Choisir un thème:",
     options=["Classique", "Médical", "Moderne"],
-    index=0
+    index=["Classique", "Médical", "Moderne"].index(DEFAULT_THEME)
 )
 
-# Define color themes
-color_themes = {
-    "Classique": {
-        'Xeljanz 5 mg 2x/j': '#1f77b4',
-        'Xeljanz 10 mg 2x/j': '#ff7f0e',
-        'Xeljanz global': '#2ca02c'
-    },
-    "Médical": {
-        'Xeljanz 5 mg 2x/j': '#2E86C1',
-        'Xeljanz 10 mg 2x/j': '#E74C3C',
-        'Xeljanz global': '#27AE60'
-    },
-    "Moderne": {
-        'Xeljanz 5 mg 2x/j': '#6C5CE7',
-        'Xeljanz 10 mg 2x/j': '#FD79A8',
-        'Xeljanz global': '#00CEC9'
-    }
-}
-
-group_colors = color_themes[color_theme]
+# Faceted mode: one panel per drug, discovered from the group names
+faceted = st.sidebar.checkbox(
+    "Vue multi-médicaments (facettes)",
+    value=False,
+    help="Un panneau par médicament, axes partagés"
+)
 
-# Filter data based on selections
-filtered_df = df[
-    (df['Groupe'].isin(selected_groups)) & 
-    (df['Effet indésirable'].isin(selected_effects))
-].copy()
+# Follow-up animation (needs event times in the patient-level data)
+animated = False
+if PATIENTS_PATH and EVENTS_PATH:
+    animated = st.sidebar.checkbox(
+        "Animation au fil du suivi",
+        value=False,
+        help=f"Taux cumulés par fenêtre de suivi (colonne '{TIME_COLUMN}' des événements)"
+    )
+    if animated:
+        n_windows = st.sidebar.slider("Fenêtres de suivi", min_value=5, max_value=60, value=40, step=5)
 
-# Show data summary
-st.markdown("### 📈 Résumé des données")
+# Define color themes (palettes are assigned to the groups found in the data)
+color_themes = {
+    "Classique": ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                  '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'],
+    "Médical": ['#2E86C1', '#E74C3C', '#27AE60', '#8E44AD', '#F39C12',
+                '#16A085', '#C0392B', '#2C3E50', '#D35400', '#7F8C8D'],
+    "Moderne": ['#6C5CE7', '#FD79A8', '#00CEC9', '#FDCB6E', '#E17055',
+                '#0984E3', '#A29BFE', '#55EFC4', '#FAB1A0', '#636E72']
+}
 
-col1, col2, col3, col4 = st.columns(4)
+def build_palette(theme, groups):
+    """Map each group to its own color of the theme.
 
-with col1:
-    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-    st.metric("Effets sélectionnés", len(selected_effects))
-    st.markdown('</div>', unsafe_allow_html=True)
+    Up to the size of the theme, groups take its colors in order; beyond
+    that, as many distinct colors are sampled along the theme's colors so
+    that no two groups (arms of a legend or facet) share one.
+    """
+    colors = color_themes[theme]
+    if len(groups) > len(colors):
+        colors = sample_colorscale(make_colorscale(colors), len(groups))
+    return dict(zip(groups, colors))
 
-with col2:
-    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-    st.metric("Groupes sélectionnés", len(selected_groups))
-    st.markdown('</div>', unsafe_allow_html=True)
+def group_drugs(data, groups):
+    """Drug of each group: the 'Médicament' column when present, else the first word of the group."""
+    if 'Médicament' in data.columns:
+        mapping = data.drop_duplicates('Groupe').set_index('Groupe')['Médicament']
+        return [mapping[group] for group in groups]
+    return [str(group).split(' ', 1)[0] for group in groups]
 
-with col3:
-    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-    st.metric("Points de données", len(filtered_df))
-    st.markdown('</div>', unsafe_allow_html=True)
+group_colors = build_palette(color_theme, groups_available)
 
-with col4:
-    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-    max_ti = filtered_df['TI'].max() if not filtered_df.empty else 0
-    st.metric("TI Maximum", f"{max_ti:.2f}")
-    st.markdown('</div>', unsafe_allow_html=True)
+@st.cache_resource
+def validate_dataset(version, _data):
+    """Invariant violations of the loaded dataset, checked once per dataset version."""
+    return check_dataset(_data, group_drugs)
 
 # Create the forest plot
-def create_forest_plot(data, height, width, colors):
+def create_forest_plot(data, height, width, colors, faceted=False, x_range=None, return_rows=False):
+    """Forest plot with one trace per group.
+
+    With `return_rows`, also returns the row order and bounds of the traces:
+    trace i shows the rows order[bounds[i]:bounds[i + 1]] of `data`.
+    """
     if data.empty:
         st.warning("⚠️ Aucune donnée à afficher avec les filtres sélectionnés.")
         return None
     
-    # Create y-axis positions and labels
-    unique_effects = data['Effet indésirable'].unique()
-    n_effects = len(unique_effects)
+    pct = level_pct(data)
     
-    group_order = ['Xeljanz 5 mg 2x/j', 'Xeljanz 10 mg 2x/j', 'Xeljanz global']
+    # Effects and groups are discovered from the data, in order of appearance
+    effect_codes, unique_effects = pd.factorize(data['Effet indésirable'], sort=False)
+    group_codes, group_order, order, bounds = group_slices(data['Groupe'])
+    n_effects = len(unique_effects)
     
-    y_positions = []
-    y_labels = []
+    # Facets: one column per drug (or a single panel), each group gets a slot inside its facet
+    if faceted:
+        group_facets, facet_names = pd.factorize(pd.Series(group_drugs(data, group_order)), sort=False)
+    else:
+        group_facets, facet_names = np.zeros(len(group_order), dtype=int), ['']
+    group_slots = np.zeros(len(group_order), dtype=int)
+    slots_used = {}
+    for i, facet in enumerate(group_facets):
+        group_slots[i] = slots_used.get(facet, 0)
+        slots_used[facet] = group_slots[i] + 1
+    n_slots = max(slots_used.values())
+    spacing = max(3, n_slots * 0.7 + 0.9)
     
-    for idx, row in data.iterrows():
-        effect = row['Effet indésirable']
-        group = row['Groupe']
-        
-        effect_idx = list(unique_effects).index(effect)
-        if group in group_order:
-            group_idx = group_order.index(group)
-        else:
-            continue
-        
-        base_pos = (n_effects - effect_idx - 1) * 3
-        y_pos = base_pos - group_idx * 0.7
-        y_positions.append(y_pos)
-        
-        if group == 'Xeljanz 10 mg 2x/j':
-            y_labels.append(effect)
-        else:
-            y_labels.append('')
-    
-    data = data.copy()
-    data['y_pos'] = y_positions[:len(data)]
+    # Create y-axis positions and labels in one vectorized pass
+    # (kept in a side array so the shared data is never copied or mutated)
+    y_pos = (n_effects - effect_codes - 1) * spacing - group_slots[group_codes] * 0.7
+    tick_vals = (n_effects - np.arange(n_effects) - 1) * spacing - (n_slots - 1) / 2 * 0.7
     
     # Calculate x-axis range
     x_min = data['IC95_min'].min()
     x_max = data['IC95_max'].max()
     x_range_min = max(0, x_min - 0.1)
     x_range_max = x_max + 0.1
+    if x_range is not None:
+        x_range_min, x_range_max = x_range
     
-    # Create the plot
-    fig = go.Figure()
-    
-    # Add background regions
-    fig.add_vrect(
-        x0=x_range_min, x1=1,
-        fillcolor="lightgreen", opacity=0.2,
-        layer="below", line_width=0,
+    # Create the plot (one figure, facets share both axes)
+    n_facets = len(facet_names)
+    fig = make_subplots(
+        rows=1, cols=n_facets,
+        shared_yaxes=True,
+        horizontal_spacing=min(0.02, 1 / max(n_facets - 1, 1)),
+        subplot_titles=list(facet_names) if faceted else None
     )
     
-    fig.add_vrect(
-        x0=1, x1=x_range_max,
-        fillcolor="lightcoral", opacity=0.2,
-        layer="below", line_width=0,
-    )
+    # Add background regions and reference line (TI = 1) to every facet in one go
+    shapes = []
+    for k in range(1, n_facets + 1):
+        xref = 'x' if k == 1 else f'x{k}'
+        yref = ('y' if k == 1 else f'y{k}') + ' domain'
+        shapes += [
+            dict(type='rect', xref=xref, yref=yref, x0=x_range_min, x1=1, y0=0, y1=1,
+                 fillcolor="lightgreen", opacity=0.2, layer="below", line_width=0),
+            dict(type='rect', xref=xref, yref=yref, x0=1, x1=x_range_max, y0=0, y1=1,
+                 fillcolor="lightcoral", opacity=0.2, layer="below", line_width=0),
+            dict(type='line', xref=xref, yref=yref, x0=1, x1=1, y0=0, y1=1,
+                 line=dict(dash="dash", color="black", width=2)),
+        ]
+    
+    # Rows grouped once by group code; each trace takes a contiguous slice
+    ti = data['TI'].to_numpy()[order]
+    y_sorted = y_pos[order]
+    error_low = np.maximum(data['Error_Low'].to_numpy(), 0)[order]
+    error_high = np.maximum(data['Error_High'].to_numpy(), 0)[order]
+    customdata = np.column_stack((data['Effet indésirable'].to_numpy(),
+                                  data['IC95_min'].to_numpy(),
+                                  data['IC95_max'].to_numpy(),
+                                  data['Nombre de cas'].to_numpy(),
+                                  data['Total Patients'].to_numpy(),
+                                  data['Pourcentage'].to_numpy()))[order]
     
     # Add data points
-    for group in group_order:
-        if group not in selected_groups:
-            continue
-            
-        group_data = data[data['Groupe'] == group]
-        if group_data.empty:
-            continue
-        
-        error_low = np.maximum(group_data['Error_Low'], 0)
-        error_high = np.maximum(group_data['Error_High'], 0)
+    traces = []
+    for i, group in enumerate(group_order):
+        rows = slice(bounds[i], bounds[i + 1])
+        is_global = 'global' in str(group).lower()
         
-        fig.add_trace(go.Scatter(
-            x=group_data['TI'],
-            y=group_data['y_pos'],
+        facet = int(group_facets[i]) + 1
+        traces.append(go.Scatter(
+            x=ti[rows],
+            y=y_sorted[rows],
             mode='markers',
             marker=dict(
                 color=colors[group],
-                size=10 if group == 'Xeljanz global' else 8,
-                symbol='diamond' if group == 'Xeljanz global' else 'circle',
+                size=10 if is_global else 8,
+                symbol='diamond' if is_global else 'circle',
                 line=dict(width=1, color='black')
             ),
             error_x=dict(
                 type='data',
                 symmetric=False,
-                array=error_high,
-                arrayminus=error_low,
+                array=error_high[rows],
+                arrayminus=error_low[rows],
                 color=colors[group],
                 thickness=2,
                 width=3
@@ -325,46 +662,42 @@ def create_forest_plot(data, height, width, colors):
             hovertemplate=f'<b>{group}</b><br>' +
                          'Effet: %{customdata[0]}<br>' +
                          'TI: %{x:.3f}<br>' +
-                         'IC 95%: [%{customdata[1]:.3f}, %{customdata[2]:.3f}]<br>' +
+                         f'IC {pct}%: [%{{customdata[1]:.3f}}, %{{customdata[2]:.3f}}]<br>' +
                          'Nombre de cas: %{customdata[3]}<br>' +
                          'Total Patients: %{customdata[4]}<br>' +
                          'Pourcentage: %{customdata[5]:.2f}%<extra></extra>',
-            customdata=np.column_stack((group_data['Effet indésirable'],
-                                       group_data['IC95_min'],
-                                       group_data['IC95_max'],
-                                       group_data['Nombre de cas'],
-                                       group_data['Total Patients'],
-                                       group_data['Pourcentage']))
+            customdata=customdata[rows],
+            xaxis='x' if facet == 1 else f'x{facet}',
+            yaxis='y' if facet == 1 else f'y{facet}'
         ))
-    
-    # Add reference line
-    fig.add_vline(x=1, line_dash="dash", line_color="black", line_width=2)
+    fig.add_traces(traces)
     
     # Update layout
+    fig.update_xaxes(
+        title=dict(text=f'Taux d\'incidence (IC {pct}%)', font=dict(size=14)),
+        showgrid=True,
+        gridwidth=1,
+        gridcolor='lightgray',
+        range=[x_range_min, x_range_max],
+        dtick=0.5,
+        matches='x'
+    )
+    fig.update_yaxes(
+        tickmode='array',
+        tickvals=tick_vals,
+        ticktext=list(unique_effects),
+        showgrid=True,
+        gridwidth=1,
+        gridcolor='lightgray',
+        range=[-2, y_pos.max() + 2]
+    )
+    fig.update_yaxes(title=dict(text='Effets indésirables', font=dict(size=14)), row=1, col=1)
     fig.update_layout(
         title=dict(
-            text='Taux d\'incidence avec intervalles de confiance à 95%',
+            text=f'Taux d\'incidence avec intervalles de confiance à {pct}%',
             x=0.5,
             font=dict(size=18, color="#2C3E50")
         ),
-        xaxis=dict(
-            title=dict(text='Taux d\'incidence (IC 95%)', font=dict(size=14)),
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='lightgray',
-            range=[x_range_min, x_range_max],
-            dtick=0.5,
-        ),
-        yaxis=dict(
-            title=dict(text='Effets indésirables', font=dict(size=14)),
-            tickmode='array',
-            tickvals=[pos for i, pos in enumerate(y_positions[:len(data)]) if i < len(y_labels) and y_labels[i] != ''],
-            ticktext=[label for label in y_labels if label != ''],
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='lightgray',
-            range=[-2, max(y_positions[:len(data)]) + 2] if y_positions else [0, 1]
-        ),
         height=height,
         width=width,
         showlegend=True,
@@ -376,16 +709,185 @@ def create_forest_plot(data, height, width, colors):
             x=0.5
         ),
         margin=dict(l=300, r=50, t=100, b=100),
-        plot_bgcolor='white'
+        plot_bgcolor='white',
+        shapes=shapes
     )
     
+    if return_rows:
+        return fig, order, bounds
+    return fig
+
+@st.cache_resource
+def build_default_snapshot(version, effects, _data):
+    """Precompute the default view once per dataset version.
+
+    Holds the figure JSON, the summary metrics and the table slice for all
+    groups and the default (bounded) effect selection at the default size
+    and theme, so cold sessions can render it without running the pipeline.
+    """
+    view = filter_view(_data, _data['Groupe'].unique(), list(effects))
+    fig = create_forest_plot(view, DEFAULT_HEIGHT, DEFAULT_WIDTH, build_palette(DEFAULT_THEME, _data['Groupe'].unique()))
+    return {
+        'version': version,
+        'figure': fig.to_json() if fig else None,
+        'n_points': len(view),
+        'max_ti': float(view['TI'].max()) if not view.empty else 0.0,
+        'n_above_1': int((view['IC95_min'] > 1).sum()),
+        'table': view[TABLE_COLUMNS].iloc[:DEFAULT_PAGE_SIZE].round(3).rename(columns=interval_labels(view)),
+    }
+
+def create_animated_forest_plot(windows, groups, effects, height, width, colors, faceted, level):
+    """Forest plot of the last window with one animation frame per follow-up window.
+
+    Frames share the base figure's layout and only carry the x values and
+    error bars of each trace.
+    """
+    rows = windows['rows']
+    sel = rows['Groupe'].isin(groups).to_numpy() & rows['Effet indésirable'].isin(effects).to_numpy()
+    ti = windows['TI'][:, sel]
+    low = np.minimum(np.nan_to_num(windows['IC_min'][:, sel]), np.nan_to_num(ti))
+    high = np.maximum(np.nan_to_num(windows['IC_max'][:, sel]), np.nan_to_num(ti))
+    base = rows[sel].reset_index(drop=True)
+    base['Nombre de cas'] = windows['cases'][-1, sel]
+    base['TI'] = ti[-1].round(3)
+    base['IC95_min'] = low[-1].round(3)
+    base['IC95_max'] = high[-1].round(3)
+    base = finalize_dataset(base, version='animation', level=level)
+    plot = create_forest_plot(base, height, width, colors, faceted,
+                              x_range=(0, high.max() + 0.1 if high.size else 1), return_rows=True)
+    if plot is None:
+        return None
+    # Frames follow the rows of each trace exactly as the base figure laid them out
+    fig, order, bounds = plot
+    ti, low, high = ti[:, order], low[:, order], high[:, order]
+    
+    frames = []
+    for w, window_end in enumerate(windows['window_ends']):
+        frame_data = []
+        for i in range(len(fig.data)):
+            cols = slice(bounds[i], bounds[i + 1])
+            frame_data.append(dict(
+                type='scatter',
+                x=ti[w, cols].round(3),
+                error_x=dict(array=(high[w, cols] - ti[w, cols]).round(3), arrayminus=(ti[w, cols] - low[w, cols]).round(3))
+            ))
+        frames.append(go.Frame(data=frame_data, name=f"{window_end:.2f}", traces=list(range(len(fig.data)))))
+    fig.frames = frames
+    
+    for trace in fig.data:
+        trace.hovertemplate = f'<b>{trace.name}</b><br>Effet: %{{customdata[0]}}<br>TI cumulé: %{{x:.3f}}<extra></extra>'
+    fig.update_layout(
+        title_text=f'Taux d\'incidence cumulés au fil du suivi (IC {level_pct(base)}%)',
+        updatemenus=[dict(
+            type='buttons', direction='left', showactive=False,
+            x=0, y=-0.12, xanchor='left', yanchor='top',
+            buttons=[
+                dict(label='▶ Lecture', method='animate',
+                     args=[None, dict(frame=dict(duration=300, redraw=False), transition=dict(duration=150), fromcurrent=True)]),
+                dict(label='⏸ Pause', method='animate',
+                     args=[[None], dict(frame=dict(duration=0, redraw=False), mode='immediate')])
+            ]
+        )],
+        sliders=[dict(
+            active=len(frames) - 1,
+            x=0.1, y=-0.12, len=0.9, yanchor='top',
+            currentvalue=dict(prefix='Suivi ≤ ', suffix=' ans'),
+            steps=[dict(label=frame.name, method='animate',
+                        args=[[frame.name], dict(mode='immediate', frame=dict(duration=0, redraw=False))])
+                   for frame in frames]
+        )],
+        margin=dict(l=300, r=50, t=100, b=180)
+    )
     return fig
 
+# Filter data based on selections (view on the shared dataset, never mutated)
+if rank_by is not None:
+    filtered_df = filter_view(df, selected_groups, ranked_effects, rank_by, top_k)
+else:
+    filtered_df = filter_view(df, selected_groups, selected_effects)
+
+# Untouched widgets: serve the prebuilt snapshot instead of rebuilding everything
+is_default_view = (
+    list(selected_groups) == list(groups_available)
+    and list(selected_effects) == default_effects
+    and plot_height == DEFAULT_HEIGHT
+    and plot_width == DEFAULT_WIDTH
+    and color_theme == DEFAULT_THEME
+    and not faceted
+    and rank_by is None
+    and not animated
+)
+snapshot = build_default_snapshot(df.attrs['version'], tuple(default_effects), df) if is_default_view else None
+
+# Show data summary
+st.markdown("### 📈 Résumé des données")
+
+col1, col2, col3, col4, col5 = st.columns(5)
+
+with col1:
+    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
+    st.metric("Effets sélectionnés", filtered_df['Effet indésirable'].nunique() if rank_by else len(selected_effects))
+    st.markdown('</div>', unsafe_allow_html=True)
+
+with col2:
+    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
+    st.metric("Groupes sélectionnés", len(selected_groups))
+    st.markdown('</div>', unsafe_allow_html=True)
+
+with col3:
+    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
+    st.metric("Points de données", snapshot['n_points'] if snapshot else len(filtered_df))
+    st.markdown('</div>', unsafe_allow_html=True)
+
+with col4:
+    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
+    if snapshot:
+        max_ti = snapshot['max_ti']
+    else:
+        max_ti = filtered_df['TI'].max() if not filtered_df.empty else 0
+    st.metric("TI Maximum", f"{max_ti:.2f}")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+with col5:
+    st.markdown('<div class="metric-container">', unsafe_allow_html=True)
+    n_above_1 = snapshot['n_above_1'] if snapshot else int((filtered_df['IC95_min'] > 1).sum())
+    st.metric(f"IC {level_pct(df)}% au-dessus de 1", n_above_1)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# Data consistency checks (cached per dataset version)
+violation_counts, violations = validate_dataset(source_df.attrs['version'], source_df)
+n_violations = int(violation_counts.sum())
+with st.expander(f"🔍 Cohérence des données : {'aucune anomalie' if n_violations == 0 else f'{n_violations} anomalie(s)'}",
+                 expanded=False):
+    for rule, count in violation_counts.items():
+        st.markdown(f"{'✅' if count == 0 else '⚠️'} {rule} : **{count}**")
+    if n_violations:
+        st.dataframe(violations, use_container_width=True, hide_index=True)
+        if len(violations) < n_violations:
+            st.caption(f"{len(violations)} anomalies affichées sur {n_violations}")
+
+# Memory footprint: shared dataset (once per process) vs. this session's copies
+st.sidebar.subheader("🧠 Mémoire")
+shared_kb = df.memory_usage(index=True, deep=True).sum() / 1024
+session_kb = session_memory_bytes(filtered_df, df) / 1024
+st.sidebar.caption(f"Jeu de données partagé : {shared_kb:.1f} Ko (une fois par processus)")
+st.sidebar.caption(f"Mémoire propre à la session : {session_kb:.1f} Ko")
+
 # Generate and display the plot
 st.markdown("### 📊 Forest Plot")
 
-if len(selected_groups) > 0 and len(selected_effects) > 0:
-    fig = create_forest_plot(filtered_df, plot_height, plot_width, group_colors)
+if len(selected_groups) > 0 and (len(selected_effects) > 0 or rank_by is not None):
+    windows = load_cumulative_windows(PATIENTS_PATH, EVENTS_PATH, n_windows, confidence_level) if animated else None
+    if animated and windows is None:
+        st.warning(f"⚠️ Animation indisponible : colonne '{TIME_COLUMN}' absente des événements.")
+    if windows is not None:
+        shown_effects = filtered_df['Effet indésirable'].unique() if rank_by is not None else selected_effects
+        fig = create_animated_forest_plot(windows, selected_groups, shown_effects, plot_height, plot_width,
+                                          group_colors, faceted, confidence_level)
+    elif snapshot and snapshot['figure']:
+        fig = json.loads(snapshot['figure'])
+    else:
+        fig = create_forest_plot(filtered_df, plot_height, plot_width, group_colors, faceted)
     if fig:
         st.plotly_chart(fig, use_container_width=True)
         
@@ -393,31 +895,177 @@ if len(selected_groups) > 0 and len(selected_effects) > 0:
         st.markdown("### 💾 Téléchargement")
         if st.button("📥 Télécharger le graphique (HTML)", type="primary"):
             try:
-                fig.write_html("forest_plot_streamlit.html")
+                pio.write_html(fig, "forest_plot_streamlit.html")
                 st.success("✅ Graphique sauvegardé sous 'forest_plot_streamlit.html'")
             except Exception as e:
                 st.error(f"❌ Erreur lors de la sauvegarde: {str(e)}")
+        
+        # Static image export through the warm renderer pool
+        renderer = get_renderer_pool()
+        ecol1, ecol2 = st.columns([1, 2])
+        with ecol1:
+            image_format = st.selectbox("Format d'image:", options=["PNG", "SVG", "PDF"])
+        with ecol2:
+            fmt = image_format.lower()
+            st.download_button(
+                f"🖼️ Télécharger l'image ({image_format})",
+                data=functools.partial(renderer.export, fig, fmt, plot_width, plot_height),
+                file_name=f"forest_plot.{fmt}",
+                mime=IMAGE_FORMATS[fmt]
+            )
+        recent, median_ms = renderer.timings()
+        if recent:
+            last = recent[-1]
+            st.caption(
+                f"Dernier export {last['format'].upper()} : {last['total_ms']:.0f} ms "
+                f"(rendu {last['render_ms']:.0f} ms, attente {last['wait_ms']:.0f} ms) · "
+                f"médiane {median_ms:.0f} ms sur {len(recent)} exports"
+            )
 else:
     st.warning("⚠️ Veuillez sélectionner au moins un groupe et un effet indésirable.")
 
 # Data table
+@st.cache_resource
+def column_order(version, column, _data):
+    """Stable sort order of one column of the shared dataset, computed once per version."""
+    return np.argsort(_data[column].to_numpy(), kind='stable')
+
+def sorted_rows(data, view, sort_column, ascending):
+    """Positions in `data` of the rows of `view`, sorted server-side without re-sorting the view."""
+    if view is data:
+        keep = np.ones(len(data), dtype=bool)
+    else:
+        keep = np.zeros(len(data), dtype=bool)
+        keep[view.index.to_numpy()] = True
+    if sort_column is None:
+        return np.flatnonzero(keep)
+    order = column_order(data.attrs['version'], sort_column, data)
+    if not ascending:
+        order = order[::-1]
+    return order[keep[order]]
+
+class ChunkStream(io.RawIOBase):
+    """Read-only file object over a generator of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+class ChunkSink:
+    """Write-only file object collecting what a writer emits, drained between row groups."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def iter_csv(data, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """CSV export in chunks of `chunk_rows` rows; the header line is written even when no row matches."""
+    for start in range(0, max(len(rows), 1), chunk_rows):
+        chunk = data.iloc[rows[start:start + chunk_rows]][TABLE_COLUMNS].rename(columns=interval_labels(data))
+        yield chunk.to_csv(index=False, header=start == 0).encode('utf-8')
+
+def iter_parquet(data, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    sink = ChunkSink()
+    writer = None
+    for start in range(0, max(len(rows), 1), chunk_rows):
+        chunk = data.iloc[rows[start:start + chunk_rows]][TABLE_COLUMNS].rename(columns=interval_labels(data))
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
 st.markdown("### 📋 Tableau des données")
 if st.checkbox("Afficher les données détaillées"):
-    st.dataframe(
-        filtered_df[['Effet indésirable', 'Groupe', 'Nombre de cas', 'Total Patients', 'Pourcentage', 'TI', 'IC95_min', 'IC95_max']].round(3),
-        use_container_width=True
-    )
+    tcol1, tcol2, tcol3, tcol4 = st.columns(4)
+    with tcol1:
+        labels = interval_labels(df)
+        sort_choice = st.selectbox("Trier par:", options=["Ordre d'origine"] + TABLE_COLUMNS, format_func=lambda c: labels.get(c, c))
+    with tcol2:
+        ascending = st.radio("Ordre:", options=["Croissant", "Décroissant"], horizontal=True) == "Croissant"
+    with tcol3:
+        page_size = st.selectbox("Lignes par page:", options=PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+    sort_column = None if sort_choice == "Ordre d'origine" else sort_choice
+    rows = sorted_rows(df, filtered_df, sort_column, ascending)
+    n_pages = max(1, -(-len(rows) // page_size))
+    with tcol4:
+        page = st.number_input(f"Page (sur {n_pages}):", min_value=1, max_value=n_pages, value=1, step=1)
+
+    # Only the visible page is sliced and sent to the browser
+    if snapshot and sort_column is None and page == 1 and page_size == DEFAULT_PAGE_SIZE:
+        page_df = snapshot['table']
+    else:
+        page_rows = rows[(page - 1) * page_size:page * page_size]
+        page_df = df.iloc[page_rows][TABLE_COLUMNS].round(3).rename(columns=labels)
+    st.dataframe(page_df, use_container_width=True)
+    st.caption(f"Lignes {min(len(rows), (page - 1) * page_size + 1)}–{min(len(rows), page * page_size)} sur {len(rows)}")
+
+    # Full filtered result, generated chunk by chunk only when a download is requested
+    dcol1, dcol2 = st.columns(2)
+    with dcol1:
+        st.download_button(
+            "📥 Télécharger (CSV)",
+            data=lambda: ChunkStream(iter_csv(df, rows)),
+            file_name="forest_plot_donnees.csv",
+            mime="text/csv"
+        )
+    with dcol2:
+        st.download_button(
+            "📥 Télécharger (Parquet)",
+            data=lambda: ChunkStream(iter_parquet(df, rows)),
+            file_name="forest_plot_donnees.parquet",
+            mime="application/octet-stream"
+        )
 
 # Information section
 st.markdown("---")
-st.markdown("""
+pct = level_pct(df)
+st.markdown(f"""
 ### ℹ️ Informations
 - **Zone verte** : Taux d'incidence favorable (TI < 1)
 - **Zone rouge** : Taux d'incidence défavorable (TI > 1)
 - **Ligne verticale** : Référence (TI = 1)
-- **Barres d'erreur** : Intervalles de confiance à 95%
+- **Barres d'erreur** : Intervalles de confiance à {pct}%
 - **TI (Taux d'Incidence)** : Mesure du risque relatif d'occurrence d'un effet indésirable
-- **IC 95%** : Intervalle de confiance à 95% - plage dans laquelle la vraie valeur a 95% de chance de se trouver
+- **IC {pct}%** : Intervalle de confiance à {pct}% - plage dans laquelle la vraie valeur a {pct}% de chance de se trouver
 """)
 
 st.markdown("---")
@@ -448,14 +1096,15 @@ for message in st.session_state.messages:
 
 # Créer un prompt avec le contexte des données
 # On utilise la version de la DataFrame sans filtres pour donner un contexte complet
-data_context = df.to_string() # df.to_string() inclura toutes les colonnes
+# Les colonnes d'intervalle portent le niveau de confiance choisi (ex: IC90_min)
+data_context = df.rename(columns=interval_labels(df)).to_string() # df.to_string() inclura toutes les colonnes
 system_prompt = (
     "Tu es un assistant expert en analyse de données médicales pour le médicament Xeljanz. "
     "Réponds aux questions de l'utilisateur de manière concise et précise, en te basant exclusivement "
     "sur les données fournies ci-dessous. Si une information n'est pas présente, précise-le. "
-    "Les colonnes sont : 'Effet indésirable', 'Groupe' (dosage), 'Nombre de cas', 'Total Patients', 'Pourcentage', 'TI' (Taux d'Incidence), 'IC95_min' et 'IC95_max' "
-    "(intervalle de confiance à 95%). "
-    "Explique clairement les concepts si l'utilisateur semble ne pas les connaître (ex: TI, IC95%, Nombre de cas, Total Patients). "
+    f"Les colonnes sont : 'Effet indésirable', 'Groupe' (dosage), 'Nombre de cas', 'Total Patients', 'Pourcentage', 'TI' (Taux d'Incidence), 'IC{pct}_min' et 'IC{pct}_max' "
+    f"(intervalle de confiance à {pct}%). "
+    f"Explique clairement les concepts si l'utilisateur semble ne pas les connaître (ex: TI, IC{pct}%, Nombre de cas, Total Patients). "
     "Ne fais pas de spéculations au-delà des données fournies. "
     "Voici les données : \n\n"
     f"{data_context}"
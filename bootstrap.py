@@ -0,0 +1,137 @@
+"""Bootstrap confidence intervals for incidence rates from patient-level records.
+
+Patient table: one row per patient with 'Patient', 'Groupe' and
+'Années-patients' (exposure). Event table: one row per adverse event with
+'Patient' and 'Effet indésirable'. The engine produces the same
+'TI' / 'IC95_min' / 'IC95_max' columns as the precomputed dataset.
+"""
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from ingest import RATE_SCALE
+from workers import detached_main, spawn_executor
+
+# Upper bound on resampled indices held in memory at once (replicates x patients)
+MAX_DRAWS_PER_BLOCK = 5_000_000
+
+
+def task_seed(seed, effect, group):
+    """Seed of one (effect, group) task, independent of scheduling order."""
+    return np.random.SeedSequence([seed, zlib.crc32(f"{effect}\x1f{group}".encode("utf-8"))])
+
+
+def bootstrap_rate_ci(events, exposure, n_replicates, seed, level=0.95):
+    """Percentile bootstrap CI of sum(events) / sum(exposure), resampling patients.
+
+    Replicates are drawn as a (replicates x patients) index matrix, in blocks
+    bounded by MAX_DRAWS_PER_BLOCK.
+    """
+    events = np.asarray(events, dtype=float)
+    exposure = np.asarray(exposure, dtype=float)
+    n = len(events)
+    total_exposure = exposure.sum()
+    if n == 0 or total_exposure <= 0:
+        return np.nan, np.nan, np.nan
+    rng = np.random.default_rng(seed)
+    rates = np.empty(n_replicates)
+    block = max(1, MAX_DRAWS_PER_BLOCK // n)
+    for start in range(0, n_replicates, block):
+        stop = min(n_replicates, start + block)
+        idx = rng.integers(0, n, size=(stop - start, n))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates[start:stop] = events[idx].sum(axis=1) / exposure[idx].sum(axis=1) * RATE_SCALE
+    alpha = (1 - level) / 2
+    low, high = np.nanquantile(rates, [alpha, 1 - alpha])
+    return events.sum() / total_exposure * RATE_SCALE, low, high
+
+
+def _run_task(task):
+    effect, group, events, exposure, n_replicates, seed, level = task
+    ti, low, high = bootstrap_rate_ci(events, exposure, n_replicates, task_seed(seed, effect, group), level)
+    return effect, group, int(events.sum()), len(events), ti, low, high
+
+
+def iter_tasks(patients, events, keys):
+    """Per-patient event counts and exposure for each requested (effect, group)."""
+    counts = events.groupby(['Effet indésirable', 'Patient'], sort=False).size()
+    # Split once: per-key lookups stay O(1) instead of scanning the index
+    by_effect = {effect: rows.droplevel(0) for effect, rows in counts.groupby(level=0, sort=False)}
+    by_group = {group: rows for group, rows in patients.groupby('Groupe', sort=False)}
+    for effect, group in keys:
+        rows = by_group.get(group)
+        if rows is None or rows.empty:
+            continue
+        if effect in by_effect:
+            per_patient = by_effect[effect].reindex(rows['Patient'], fill_value=0).to_numpy()
+        else:
+            per_patient = np.zeros(len(rows), dtype=int)
+        yield effect, group, per_patient, rows['Années-patients'].to_numpy()
+
+
+class BootstrapEngine:
+    """Process pool plus result cache keyed by (dataset version, effect, group, replicates, level).
+
+    The pool is started lazily and reused; only the (effect, group) pairs
+    missing from the cache are sent to it. The lock only guards the cache:
+    sessions run concurrently, and a session needing pairs another one is
+    computing waits for those instead of computing them twice.
+    """
+
+    def __init__(self, max_workers=None, seed=0, level=0.95):
+        self.max_workers = max_workers
+        self.seed = seed
+        self.level = level
+        self._pool = None
+        self._cache = {}
+        # Cache key -> Event set once the session computing it is done
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = spawn_executor(self.max_workers)
+        return self._pool
+
+    def compute(self, version, patients, events, n_replicates, level=None):
+        """Return one row per (effect, group) with counts, TI and bootstrap CI at `level`."""
+        level = self.level if level is None else level
+        effects = pd.unique(events['Effet indésirable'])
+        groups = pd.unique(patients['Groupe'])
+        keys = [(effect, group) for effect in effects for group in groups]
+        cache_key = lambda effect, group: (version, effect, group, n_replicates, level)
+        done = threading.Event()
+        with self._lock:
+            waiting = {self._pending[cache_key(*key)] for key in keys if cache_key(*key) in self._pending}
+            missing = [key for key in keys if cache_key(*key) not in self._cache and cache_key(*key) not in self._pending]
+            for key in missing:
+                self._pending[cache_key(*key)] = done
+            executor = self._executor() if missing else None
+        try:
+            if missing:
+                tasks = ((effect, group, ev, ex, n_replicates, self.seed, level)
+                         for effect, group, ev, ex in iter_tasks(patients, events, missing))
+                with detached_main():
+                    results = executor.map(_run_task, tasks)
+                for effect, group, *result in results:
+                    with self._lock:
+                        self._cache[cache_key(effect, group)] = result
+        finally:
+            with self._lock:
+                for key in missing:
+                    del self._pending[cache_key(*key)]
+            done.set()
+        for event in waiting:
+            event.wait()
+        with self._lock:
+            rows = [(effect, group, *self._cache[cache_key(effect, group)])
+                    for effect, group in keys if cache_key(effect, group) in self._cache]
+        return pd.DataFrame(rows, columns=['Effet indésirable', 'Groupe', 'Nombre de cas', 'Total Patients',
+                                           'TI', 'IC95_min', 'IC95_max'])
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
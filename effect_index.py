@@ -0,0 +1,96 @@
+"""Search index over adverse-event terms grouped by system organ class (SOC).
+
+Built once per dataset version: a sorted array of word suffixes of every
+normalized term answers prefix queries with two binary searches, and an
+inverted trigram index answers fragment queries (typos, word middles).
+Queries only ever return a bounded number of terms.
+"""
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Class of the terms that carry none
+UNCLASSIFIED = "Non classé"
+
+
+def normalize(text):
+    """Lower case words without accents or punctuation, so 'Décès' matches 'deces'."""
+    decomposed = unicodedata.normalize('NFKD', str(text).lower())
+    kept = (char if char.isalnum() else ' ' for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(''.join(kept).split())
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EffectIndex:
+    """Terms, their classes and the prefix / trigram lookups."""
+
+    def __init__(self, terms, classes=None):
+        unique_terms, positions = np.unique(np.asarray(terms, dtype=object), return_index=True)
+        # Keep the dataset order of appearance
+        order = np.argsort(positions, kind='stable')
+        self.terms = unique_terms[order]
+        if classes is None:
+            classes = np.full(len(terms), UNCLASSIFIED, dtype=object)
+        classes = pd.Series(classes, dtype=object).fillna(UNCLASSIFIED).to_numpy()[positions[order]]
+        self.class_codes, classes = pd.factorize(classes, sort=True)
+        self.classes = pd.Index(classes)
+        self.class_sizes = np.bincount(self.class_codes, minlength=len(self.classes))
+
+        # Prefix lookup: every word start of every term, sorted
+        suffixes, owners = [], []
+        postings = {}
+        for term_id, term in enumerate(self.terms):
+            text = normalize(term)
+            words = text.split()
+            for start in range(len(words)):
+                suffixes.append(' '.join(words[start:]))
+                owners.append(term_id)
+            for gram in trigrams(text):
+                postings.setdefault(gram, []).append(term_id)
+        order = np.argsort(np.array(suffixes, dtype=object), kind='stable')
+        self._suffixes = np.array(suffixes, dtype=object)[order]
+        self._owners = np.array(owners, dtype=np.int64)[order]
+        self._postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def class_of(self, class_name):
+        """Mask of the terms in `class_name` (every term for None)."""
+        if class_name is None:
+            return np.ones(len(self.terms), dtype=bool)
+        return self.class_codes == self.classes.get_loc(class_name)
+
+    def prefix_ids(self, query):
+        """Terms with a word starting with `query`, in dataset order."""
+        start = np.searchsorted(self._suffixes, query, side='left')
+        stop = np.searchsorted(self._suffixes, query + '\uffff', side='left')
+        return np.unique(self._owners[start:stop])
+
+    def trigram_ids(self, query, min_share=0.5):
+        """Terms sharing at least `min_share` of the query trigrams, best matches first."""
+        grams = [gram for gram in trigrams(query) if gram in self._postings]
+        needed = max(1, int(np.ceil(min_share * len(trigrams(query)))))
+        if len(grams) < needed:
+            return np.empty(0, dtype=np.int64)
+        hits = np.bincount(np.concatenate([self._postings[gram] for gram in grams]), minlength=len(self.terms))
+        ids = np.flatnonzero(hits >= needed)
+        return ids[np.argsort(-hits[ids], kind='stable')]
+
+    def search(self, query='', class_name=None, limit=100):
+        """At most `limit` terms of `class_name` matching `query`: prefix matches, then fragments."""
+        in_class = self.class_of(class_name)
+        query = normalize(query)
+        if not query:
+            return self.terms[np.flatnonzero(in_class)[:limit]].tolist()
+        ids = self.prefix_ids(query)
+        if len(query) >= 3:
+            ids = np.concatenate([ids, self.trigram_ids(query)])
+            ids = ids[np.sort(np.unique(ids, return_index=True)[1])]
+        ids = ids[in_class[ids]]
+        return self.terms[ids[:limit]].tolist()
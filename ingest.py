@@ -0,0 +1,147 @@
+"""Chunked ingestion of patient-level and event-level tables.
+
+Builds the aggregated table used by the app ('Effet indésirable', 'Groupe',
+'Nombre de cas', 'Total Patients', 'Années-patients', 'TI', 'IC95_min',
+'IC95_max') without loading the source tables in memory: each chunk is
+reduced with a group-by and added to running accumulators.
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# TI is expressed per 100 patient-years
+RATE_SCALE = 100
+DEFAULT_CHUNKSIZE = 100_000
+# Optional MedDRA system organ class of each event, carried to the aggregated rows
+CLASS_COLUMN = "Classe de systèmes d'organes"
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """Yield DataFrame chunks of a CSV file or Parquet record batches."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def table_columns(path):
+    """Column names of a CSV or Parquet file, read from its header / schema only."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def poisson_rate_ci(cases, exposure, level=0.95):
+    """Rate per 100 patient-years and its Poisson CI (Byar's approximation), vectorized."""
+    cases = np.asarray(cases, dtype=float)
+    exposure = np.asarray(exposure, dtype=float)
+    z = NormalDist().inv_cdf(1 - (1 - level) / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low = np.where(cases > 0, cases * (1 - 1 / (9 * cases) - z / (3 * np.sqrt(cases))) ** 3, 0.0)
+        upper = cases + 1
+        high = upper * (1 - 1 / (9 * upper) + z / (3 * np.sqrt(upper))) ** 3
+        scale = np.where(exposure > 0, RATE_SCALE / exposure, np.nan)
+    return cases * scale, np.maximum(low, 0) * scale, high * scale
+
+
+def aggregate_chunks(patients_path, events_path, chunksize=DEFAULT_CHUNKSIZE):
+    """Aggregate cases, patients and patient-years per (effect, group) chunk by chunk.
+
+    The patient table needs 'Patient', 'Groupe' and 'Années-patients' (one row
+    per patient); the event table needs 'Patient' and 'Effet indésirable'.
+    Memory is bounded by the chunk size, except when events carry no 'Groupe'
+    column: the group is then looked up from a patient -> group index built
+    during the patient pass, which holds one entry per patient. An optional
+    CLASS_COLUMN on events is kept (first class seen for each effect).
+    """
+    needs_lookup = 'Groupe' not in table_columns(events_path)
+    per_group = None
+    patient_group = []
+    for chunk in iter_chunks(patients_path, chunksize, ['Patient', 'Groupe', 'Années-patients']):
+        stats = chunk.groupby('Groupe', sort=False)['Années-patients'].agg(['size', 'sum'])
+        per_group = stats if per_group is None else per_group.add(stats, fill_value=0)
+        if needs_lookup:
+            patient_group.append(chunk.set_index('Patient')['Groupe'].astype('category'))
+    group_of = None
+
+    cases = None
+    classes = None
+    for chunk in iter_chunks(events_path, chunksize):
+        if CLASS_COLUMN in chunk.columns:
+            seen = chunk.drop_duplicates('Effet indésirable').set_index('Effet indésirable')[CLASS_COLUMN]
+            classes = seen if classes is None else classes.combine_first(seen)
+        if 'Groupe' not in chunk.columns:
+            if group_of is None:
+                group_of = pd.concat([s.astype(object) for s in patient_group]).astype('category')
+                patient_group = None
+            chunk = chunk.assign(Groupe=group_of.reindex(chunk['Patient']).to_numpy())
+        counts = chunk.groupby(['Effet indésirable', 'Groupe'], sort=False).size()
+        cases = counts if cases is None else cases.add(counts, fill_value=0)
+
+    groups = per_group.index
+    effects = cases.index.get_level_values(0).unique() if cases is not None else []
+    index = pd.MultiIndex.from_product([effects, groups], names=['Effet indésirable', 'Groupe'])
+    result = index.to_frame(index=False)
+    result['Nombre de cas'] = cases.reindex(index, fill_value=0).to_numpy().astype(int) if len(index) else 0
+    result['Total Patients'] = per_group['size'].reindex(result['Groupe']).to_numpy().astype(int)
+    result['Années-patients'] = per_group['sum'].reindex(result['Groupe']).to_numpy()
+    ti, low, high = poisson_rate_ci(result['Nombre de cas'], result['Années-patients'])
+    result['TI'] = ti.round(2)
+    result['IC95_min'] = low.round(2)
+    result['IC95_max'] = high.round(2)
+    if classes is not None:
+        result[CLASS_COLUMN] = classes.reindex(result['Effet indésirable']).to_numpy()
+    return result
+
+
+def cumulative_incidence(patients, events, n_windows, level=0.95, time_column='Délai (années)'):
+    """Cumulative cases, patient-years and rates per (effect, group) at the end of each follow-up window.
+
+    Follow-up is split into `n_windows` equal windows up to the longest
+    follow-up ('Années-patients' per patient). Per-window increments of cases
+    and exposure are binned once and turned into running totals with a
+    cumulative sum along the window axis. Returns the window ends, the
+    (effect, group) rows and (windows x rows) arrays.
+    """
+    follow_up = patients['Années-patients'].to_numpy(dtype=float)
+    horizon = max(follow_up.max(), events[time_column].max())
+    width = horizon / n_windows
+    group_codes, groups = pd.factorize(patients['Groupe'], sort=False)
+    n_groups = len(groups)
+
+    # Exposure: patients still followed contribute the whole window, those leaving a fraction of it
+    end_window = np.minimum((follow_up / width).astype(int), n_windows - 1)
+    flat = group_codes * n_windows + end_window
+    ending = np.bincount(flat, minlength=n_groups * n_windows).reshape(n_groups, n_windows)
+    partial = np.bincount(flat, weights=follow_up - end_window * width,
+                          minlength=n_groups * n_windows).reshape(n_groups, n_windows)
+    followed = np.bincount(group_codes, minlength=n_groups)[:, None] - np.cumsum(ending, axis=1)
+    cum_exposure = np.cumsum(followed * width + partial, axis=1)
+
+    # Cases: events binned by window, then running totals
+    group_of = pd.Series(group_codes, index=patients['Patient'].to_numpy())
+    event_groups = group_of.reindex(events['Patient'].to_numpy()).to_numpy()
+    known = ~np.isnan(event_groups)
+    effect_codes, effects = pd.factorize(events['Effet indésirable'], sort=False)
+    event_window = np.minimum((events[time_column].to_numpy(dtype=float) / width).astype(int), n_windows - 1)
+    n_rows = len(effects) * n_groups
+    flat = (effect_codes[known] * n_groups + event_groups[known].astype(int)) * n_windows + event_window[known]
+    cum_cases = np.cumsum(np.bincount(flat, minlength=n_rows * n_windows).reshape(n_rows, n_windows), axis=1)
+
+    row_exposure = np.tile(cum_exposure, (len(effects), 1))
+    ti, low, high = poisson_rate_ci(cum_cases.T, row_exposure.T, level)
+    rows = pd.MultiIndex.from_product([effects, groups], names=['Effet indésirable', 'Groupe']).to_frame(index=False)
+    rows['Total Patients'] = np.tile(np.bincount(group_codes, minlength=n_groups), len(effects))
+    return {
+        'window_ends': width * np.arange(1, n_windows + 1),
+        'rows': rows,
+        'cases': cum_cases.T,
+        'exposure': row_exposure.T,
+        'TI': ti,
+        'IC_min': low,
+        'IC_max': high,
+    }
@@ -0,0 +1,412 @@
+"""Multi-session load test for app.py.
+
+Each simulated session changes filters, moves sliders, switches themes and
+sends chat messages. Two modes:
+
+* server (default): starts `streamlit run app.py` (or targets --url) and
+  connects N concurrent clients, one thread each, speaking Streamlit's
+  websocket protocol like a browser tab. Reruns of different sessions
+  overlap on the server, so latencies include contention (bootstrap lock,
+  renderer queue, GIL, cache stampedes): this is the capacity measurement.
+* apptest: drives the sessions in-process through Streamlit's AppTest.
+  AppTest installs a process-wide runtime, so reruns are interleaved
+  round-robin and never overlap: a serial, single-session baseline.
+
+OpenAI is replaced by a local stub server with configurable latency,
+reached through OPENAI_BASE_URL. Reports p50/p95/p99 rerun latency,
+throughput and RSS per session. One warm-up session runs first, outside the
+measurements, so the RSS baseline already holds the one-time costs (imports,
+cached dataset and indexes) and the per-session figure is the marginal cost
+of an open session.
+
+    python loadtest.py --sessions 20 --steps 15 --openai-latency 0.5
+    python loadtest.py --mode apptest --sessions 5
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+CHAT_MESSAGES = [
+    "Quel groupe a le TI le plus élevé pour le zona ?",
+    "Explique l'IC 95% des infections graves.",
+    "Compare les MACE entre 5 mg et 10 mg.",
+]
+
+
+def stub_handler(latency):
+    class OpenAIStub(BaseHTTPRequestHandler):
+        """Answers /chat/completions after `latency` seconds."""
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': 'stub',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': 'Réponse simulée.'}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return OpenAIStub
+
+
+def start_openai_stub(latency):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub_handler(latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def rss_bytes():
+    """Current resident set size (Linux /proc), falling back to the peak RSS."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def tree_rss_bytes(pid):
+    """Resident set size of a process and all its descendants (Linux /proc)."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/statm') as statm:
+                total += int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            continue
+        pending += children.get(current, [])
+    return total
+
+
+def random_action(at, rng):
+    """Apply one user interaction to the session; return its name."""
+    action = rng.choice(['groupes', 'effets', 'hauteur', 'largeur', 'theme', 'chat'])
+    if action == 'groupes':
+        widget = at.sidebar.multiselect[0]
+        widget.set_value(rng.sample(list(widget.options), rng.randint(1, len(widget.options))))
+    elif action == 'effets':
+        widget = at.sidebar.multiselect[1]
+        widget.set_value(rng.sample(list(widget.options), rng.randint(1, len(widget.options))))
+    elif action == 'hauteur':
+        at.sidebar.slider[0].set_value(rng.randrange(600, 1201, 50))
+    elif action == 'largeur':
+        at.sidebar.slider[1].set_value(rng.randrange(800, 1501, 50))
+    elif action == 'theme':
+        widget = [box for box in at.sidebar.selectbox if box.label == "Choisir un thème:"][0]
+        widget.set_value(rng.choice(list(widget.options)))
+    else:
+        at.chat_input[0].set_value(rng.choice(CHAT_MESSAGES))
+    return action
+
+
+def timed_run(at):
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    errors = [exc.message for exc in at.exception] + [err.value for err in at.error]
+    return elapsed, errors
+
+
+def run_apptest_sessions(n_sessions, steps, seed, timeout):
+    """Open every session, then interleave their interactions; return (action, seconds) and errors."""
+    from streamlit.testing.v1 import AppTest
+    sessions = []
+    latencies = []
+    errors = []
+    for index in range(n_sessions):
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        elapsed, run_errors = timed_run(at)
+        sessions.append((at, random.Random(seed + index)))
+        latencies.append(('initial', elapsed))
+        errors += run_errors
+    for _ in range(steps):
+        for at, rng in sessions:
+            action = random_action(at, rng)
+            elapsed, run_errors = timed_run(at)
+            latencies.append((action, elapsed))
+            errors += run_errors
+    return sessions, latencies, errors
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, timeout):
+    """`streamlit run app.py` on `port`, returned once /_stcore/health answers."""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP_PATH, '--server.headless', 'true',
+         '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit run s'est arrêté (code {process.returncode})")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise TimeoutError("streamlit run ne répond pas")
+
+
+class WebSession:
+    """One browser session of a running app, over Streamlit's websocket protocol.
+
+    Widgets are discovered from the elements the server sends; the states of
+    the widgets changed so far are resent on every rerun, as the frontend does.
+    """
+
+    def __init__(self, url, timeout):
+        from websockets.sync.client import connect
+        self.timeout = timeout
+        self.widgets = {}
+        self.states = {}
+        self.chat_id = None
+        stream_url = url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream'
+        self._connection = connect(stream_url, subprotocols=['streamlit'], max_size=None, open_timeout=timeout)
+        self._ws = None
+
+    def __enter__(self):
+        self._ws = self._connection.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._connection.__exit__(*exc_info)
+
+    def rerun(self, triggers=()):
+        """Send the widget states, wait for the end of the script run; return (seconds, errors)."""
+        from streamlit.proto.Alert_pb2 import Alert
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        message = BackMsg()
+        message.rerun_script.widget_states.widgets.extend([*self.states.values(), *triggers])
+        start = time.perf_counter()
+        self._ws.send(message.SerializeToString())
+        errors = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self._ws.recv(timeout=self.timeout))
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                content = getattr(element, element_type)
+                if element_type == 'exception':
+                    errors.append(content.message)
+                elif element_type == 'alert' and content.format == Alert.ERROR:
+                    errors.append(content.body)
+                elif element_type == 'chat_input':
+                    self.chat_id = content.id
+                elif getattr(content, 'id', '') and getattr(content, 'label', ''):
+                    self.widgets[content.label] = content
+            elif kind == 'script_finished' and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return time.perf_counter() - start, errors
+
+    def set_state(self, label):
+        """New persistent state of the widget labelled `label` (resent on later reruns)."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        widget = self.widgets[label]
+        state = self.states[widget.id] = WidgetState(id=widget.id)
+        return widget, state
+
+
+def random_web_action(session, rng):
+    """Same interactions as random_action, as widget states; return (name, one-off triggers)."""
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+    action = rng.choice(['groupes', 'effets', 'hauteur', 'largeur', 'theme', 'chat'])
+    if action in ('groupes', 'effets'):
+        label = "Sélectionner les groupes:" if action == 'groupes' else "Sélectionner les effets indésirables:"
+        widget, state = session.set_state(label)
+        state.string_array_value.data[:] = rng.sample(list(widget.options), rng.randint(1, len(widget.options)))
+    elif action == 'hauteur':
+        session.set_state("Hauteur")[1].double_array_value.data[:] = [rng.randrange(600, 1201, 50)]
+    elif action == 'largeur':
+        session.set_state("Largeur")[1].double_array_value.data[:] = [rng.randrange(800, 1501, 50)]
+    elif action == 'theme':
+        widget, state = session.set_state("Choisir un thème:")
+        state.string_value = rng.choice(list(widget.options))
+    else:
+        trigger = WidgetState(id=session.chat_id)
+        trigger.chat_input_value.data = rng.choice(CHAT_MESSAGES)
+        return action, [trigger]
+    return action, []
+
+
+def run_web_sessions(url, n_sessions, steps, seed, timeout, think, measure_rss=None):
+    """One thread per session against `url`.
+
+    Return (action, seconds), errors, peak overlapping reruns and the RSS
+    measured while every session is still open (None without `measure_rss`).
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    in_flight = [0, 0]  # current, peak
+    rss = []
+
+    def measure_open_sessions():
+        if measure_rss is not None:
+            rss.append(measure_rss())
+
+    # Sessions open their page together: the cold start is part of the load
+    opened = threading.Barrier(n_sessions, timeout=timeout)
+    # ... and stay connected until the RSS is measured
+    finished = threading.Barrier(n_sessions, action=measure_open_sessions, timeout=timeout)
+
+    def timed(session, action, triggers=()):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        try:
+            elapsed, run_errors = session.rerun(triggers)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+        with lock:
+            latencies.append((action, elapsed))
+            errors.extend(run_errors)
+
+    def client(index):
+        rng = random.Random(seed + index)
+        try:
+            with WebSession(url, timeout) as session:
+                opened.wait()
+                timed(session, 'initial')
+                for _ in range(steps):
+                    if think:
+                        time.sleep(rng.uniform(0, think))
+                    action, triggers = random_web_action(session, rng)
+                    timed(session, action, triggers)
+                finished.wait()
+        except Exception as exc:
+            opened.abort()
+            finished.abort()
+            with lock:
+                errors.append(f"session {index}: {exc!r}")
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(n_sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, in_flight[1], rss[0] if rss else None
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['server', 'apptest'], default='server',
+                        help='server: concurrent clients of streamlit run; apptest: serial in-process baseline')
+    parser.add_argument('--url', help='already running instance (server mode), e.g. http://localhost:8501; '
+                                      'it then keeps its own OpenAI settings')
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--steps', type=int, default=10, help='interactions per session')
+    parser.add_argument('--think', type=float, default=0.0, help='max random pause between interactions (s), server mode')
+    parser.add_argument('--openai-latency', type=float, default=0.2, help='stub response delay (s)')
+    parser.add_argument('--timeout', type=float, default=60, help='per-rerun timeout (s)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    stub = start_openai_stub(args.openai_latency)
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{stub.server_port}/v1"
+    os.environ['OPENAI_API_KEY'] = 'sk-stub'
+
+    server = None
+    peak = 1
+    if args.mode == 'apptest':
+        measure_rss = rss_bytes
+    elif args.url:
+        measure_rss = None
+    else:
+        server = start_server(free_port(), args.timeout)
+        measure_rss = functools.partial(tree_rss_bytes, server.pid)
+    try:
+        # Warm-up session (seeded apart from the measured ones): pays the one-time costs
+        if args.mode == 'apptest':
+            _, _, warmup_errors = run_apptest_sessions(1, args.steps, args.seed - 1, args.timeout)
+        else:
+            url = args.url or f"http://127.0.0.1:{server.args[server.args.index('--server.port') + 1]}"
+            _, warmup_errors, _, _ = run_web_sessions(url, 1, args.steps, args.seed - 1, args.timeout, 0)
+        rss_before = measure_rss() if measure_rss else None
+        wall_start = time.perf_counter()
+        if args.mode == 'apptest':
+            # Measured while the returned sessions are still referenced (open)
+            sessions, results, errors = run_apptest_sessions(args.sessions, args.steps, args.seed, args.timeout)
+            rss_after = measure_rss()
+        else:
+            results, errors, peak, rss_after = run_web_sessions(url, args.sessions, args.steps, args.seed,
+                                                                args.timeout, args.think, measure_rss)
+        wall = time.perf_counter() - wall_start
+        errors = warmup_errors + errors
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        stub.shutdown()
+
+    latencies = [seconds for _, seconds in results]
+    by_action = {}
+    for action, seconds in results:
+        by_action.setdefault(action, []).append(seconds)
+
+    if args.mode == 'apptest':
+        print("Mode AppTest : reruns séquentiels (un seul à la fois), référence mono-session, pas une capacité")
+    else:
+        print(f"Mode serveur : {args.sessions} clients concurrents, jusqu'à {peak} reruns simultanés")
+    print(f"Sessions: {args.sessions}, reruns: {len(latencies)}")
+    if latencies:
+        print(f"Latence rerun  p50 {percentile(latencies, 50) * 1000:.0f} ms  "
+              f"p95 {percentile(latencies, 95) * 1000:.0f} ms  p99 {percentile(latencies, 99) * 1000:.0f} ms")
+        print(f"Débit: {len(latencies) / wall:.1f} reruns/s sur {wall:.1f} s")
+    if rss_after is not None:
+        print(f"RSS{' du serveur' if server else ''}: {rss_after / 2**20:.0f} Mo au total, "
+              f"{(rss_after - rss_before) / args.sessions / 2**20:.1f} Mo par session ouverte "
+              f"(au-delà des {rss_before / 2**20:.0f} Mo après échauffement)")
+    for action, values in sorted(by_action.items()):
+        print(f"  {action:<8} n={len(values):<4} p50 {percentile(values, 50) * 1000:.0f} ms  "
+              f"p95 {percentile(values, 95) * 1000:.0f} ms")
+    if errors:
+        print(f"Erreurs: {len(errors)} (première: {errors[0]})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Pool of long-lived, pre-warmed static image renderers (PNG / SVG / PDF).
+
+Each worker process starts Kaleido's persistent browser once and renders a
+throwaway figure in every format, so exports after warm-up only pay for the
+actual rendering. Requests go through a bounded queue and every export is
+timed (queue wait vs. rendering).
+"""
+import json
+import statistics
+import threading
+import time
+from collections import deque
+
+import plotly.io as pio
+
+from workers import detached_main, spawn_executor
+
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+WARMUP_FIGURE = {'data': [{'type': 'scatter', 'x': [0, 1], 'y': [0, 1]}], 'layout': {}}
+
+
+def _warm_up():
+    """Worker initializer: probe the renderer, keep it running, render once per format."""
+    try:
+        # One-off render first: fails fast when no browser is available
+        pio.to_image(WARMUP_FIGURE, format='png', validate=False)
+    except Exception:
+        return  # surfaced by the first real export instead of breaking the pool
+    try:
+        import kaleido
+        kaleido.start_sync_server(silence_warnings=True)
+    except (ImportError, AttributeError):
+        pass  # Kaleido < 1.0 keeps its own persistent subprocess
+    for fmt in FORMATS:
+        pio.to_image(WARMUP_FIGURE, format=fmt, validate=False)
+
+
+def _ready():
+    return True
+
+
+def _render(figure_json, fmt, width, height, scale):
+    start = time.perf_counter()
+    image = pio.to_image(json.loads(figure_json), format=fmt, width=width, height=height,
+                         scale=scale, validate=False)
+    return image, time.perf_counter() - start
+
+
+class RendererPool:
+    """Fixed set of warm renderer processes shared by every session.
+
+    The processes are started by the first export, not when the pool is created.
+    """
+
+    def __init__(self, size=2, max_pending=16, timeout=30, history=50):
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._timings = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _started(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = spawn_executor(self.size, initializer=_warm_up)
+                # One task per worker so all of them start (and warm up) right away
+                with detached_main():
+                    for _ in range(self.size):
+                        self._executor.submit(_ready)
+            return self._executor
+
+    def export(self, figure, fmt, width=None, height=None, scale=2):
+        """Render `figure` (Figure or dict) to image bytes in `fmt` ('png', 'svg' or 'pdf')."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Format non supporté : {fmt}")
+        queued = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("File d'attente d'export pleine")
+        try:
+            figure_json = pio.to_json(figure, validate=False)
+            executor = self._started()
+            with detached_main():
+                future = executor.submit(_render, figure_json, fmt, width, height, scale)
+            image, render_s = future.result(timeout=self.timeout)
+        finally:
+            self._slots.release()
+        total_s = time.perf_counter() - queued
+        with self._lock:
+            self._timings.append({
+                'format': fmt,
+                'total_ms': total_s * 1000,
+                'render_ms': render_s * 1000,
+                'wait_ms': (total_s - render_s) * 1000,
+            })
+        return image
+
+    def timings(self):
+        """Recent exports, oldest first, plus the median total time in ms."""
+        with self._lock:
+            recent = list(self._timings)
+        median = statistics.median(t['total_ms'] for t in recent) if recent else None
+        return recent, median
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
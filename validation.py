@@ -0,0 +1,91 @@
+"""Consistency checks of the aggregated dataset.
+
+Every rule is evaluated over all rows at once with array operations; only
+the offending rows are gathered and described (at most MAX_REPORTED_ROWS
+per rule), so the cost stays linear in the number of rows and the report
+small.
+"""
+import numpy as np
+import pandas as pd
+
+RULES = {
+    'cases': "Nombre de cas ≤ Total Patients",
+    'interval': "TI compris dans son IC",
+    'global': "Groupe global = somme des bras",
+    'errors': "Erreurs et effectifs non négatifs",
+}
+REPORT_COLUMNS = ['Règle', 'Effet indésirable', 'Groupe', 'Détail']
+# Slack for float comparisons (values are rounded to 2 decimals)
+TOLERANCE = 1e-9
+MAX_REPORTED_ROWS = 1000
+
+
+def _violations(data, rule, mask, detail, counts):
+    """Count the violations of one rule and describe the first ones.
+
+    `detail` builds the descriptions from the positions of the reported rows.
+    """
+    counts[RULES[rule]] = int(np.count_nonzero(mask))
+    if not counts[RULES[rule]]:
+        return None
+    positions = np.flatnonzero(mask)[:MAX_REPORTED_ROWS]
+    rows = data[['Effet indésirable', 'Groupe']].iloc[positions].reset_index(drop=True)
+    rows.insert(0, 'Règle', RULES[rule])
+    rows['Détail'] = detail(positions)
+    return rows
+
+
+def _fmt(values):
+    return pd.Series(values).map('{:g}'.format).to_numpy(dtype=object)
+
+
+def check_dataset(data, drugs_of):
+    """Return the number of violations per rule and a report of the offending rows.
+
+    The report has the columns REPORT_COLUMNS, one row per reported violation.
+
+    Global groups (name containing 'global') are compared, for cases only,
+    with the sum of the other groups of the same drug and effect;
+    `drugs_of(data, groups)` gives the drug of each group. Patient totals are
+    not compared: global pools may include patients outside the listed arms.
+    """
+    cases = data['Nombre de cas'].to_numpy(dtype=float)
+    patients = data['Total Patients'].to_numpy(dtype=float)
+    ti = data['TI'].to_numpy(dtype=float)
+    low = data['IC95_min'].to_numpy(dtype=float)
+    high = data['IC95_max'].to_numpy(dtype=float)
+    error_low = data['Error_Low'].to_numpy(dtype=float) if 'Error_Low' in data.columns else ti - low
+    error_high = data['Error_High'].to_numpy(dtype=float) if 'Error_High' in data.columns else high - ti
+    counts = {}
+    reports = []
+
+    reports.append(_violations(
+        data, 'cases', cases > patients,
+        lambda p: _fmt(cases[p]) + ' cas pour ' + _fmt(patients[p]) + ' patients', counts))
+
+    reports.append(_violations(
+        data, 'interval', (low > ti + TOLERANCE) | (ti > high + TOLERANCE),
+        lambda p: 'TI ' + _fmt(ti[p]) + ' hors de [' + _fmt(low[p]) + ' ; ' + _fmt(high[p]) + ']', counts))
+
+    # Per (effect, drug) sums of the non-global arms, with one bincount
+    group_codes, groups = pd.factorize(data['Groupe'], sort=False)
+    effect_codes, effects = pd.factorize(data['Effet indésirable'], sort=False)
+    drug_codes, drugs = pd.factorize(pd.Series(drugs_of(data, groups)), sort=False)
+    is_global = np.array(['global' in str(group).lower() for group in groups], dtype=bool)[group_codes]
+    key = effect_codes * len(drugs) + drug_codes[group_codes]
+    size = len(effects) * len(drugs)
+    arm_cases = np.bincount(key[~is_global], weights=cases[~is_global], minlength=size)
+    arm_rows = np.bincount(key[~is_global], minlength=size)
+    reports.append(_violations(
+        data, 'global', is_global & (arm_rows[key] > 0) & (np.abs(cases - arm_cases[key]) > TOLERANCE),
+        lambda p: _fmt(cases[p]) + ' cas vs ' + _fmt(arm_cases[key[p]]) + ' dans les bras', counts))
+
+    negative = (cases < 0) | (patients < 0) | (error_low < -TOLERANCE) | (error_high < -TOLERANCE)
+    reports.append(_violations(
+        data, 'errors', negative,
+        lambda p: 'erreurs ' + _fmt(error_low[p].round(2)) + ' / ' + _fmt(error_high[p].round(2))
+                  + ', cas ' + _fmt(cases[p]) + ', patients ' + _fmt(patients[p]), counts))
+
+    reports = [report for report in reports if report is not None]
+    report = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.Series(counts, name='Violations'), report
@@ -0,0 +1,35 @@
+"""Process pools that are safe to start from inside a Streamlit script run.
+
+While a script runs, Streamlit installs it as sys.modules['__main__'], and
+spawned workers re-execute __main__ before running anything. Worker
+processes are therefore started with a blank __main__ in place: the task
+functions live in importable modules and never need the script.
+"""
+import contextlib
+import multiprocessing
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+_main_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def detached_main():
+    """Hide the running script from processes started inside this block."""
+    with _main_lock:
+        saved = sys.modules.get('__main__')
+        placeholder = types.ModuleType('__main__')
+        sys.modules['__main__'] = placeholder
+        try:
+            yield
+        finally:
+            if sys.modules.get('__main__') is placeholder:
+                sys.modules['__main__'] = saved
+
+
+def spawn_executor(max_workers=None, initializer=None):
+    # spawn: never fork a multi-threaded server process
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer,
+                               mp_context=multiprocessing.get_context('spawn'))